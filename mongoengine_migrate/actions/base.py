@@ -506,7 +506,7 @@ class BaseAlterDocument(BaseDocumentAction):
                 key=name
             )
 
-            log.debug(">> Change %s: %s => %s", repr(name), repr(diff.old), repr(diff.new))
+            log.debug(">> Change %r: %r => %r", name, diff.old, diff.new)
             try:
                 method = getattr(self, f'change_{name}')
             except AttributeError as e:
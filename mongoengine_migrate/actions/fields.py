@@ -299,7 +299,7 @@ class AlterField(BaseFieldAction):
             if name == 'type_key' or new_value == old_value:
                 continue
 
-            log.debug(">> Change %s: %s => %s", repr(name), repr(old_value), repr(new_value))
+            log.debug(">> Change %r: %r => %r", name, old_value, new_value)
             field_handler.change_param(db_field, name)
 
             # If `db_field` was changed then work with new name further
@@ -17,7 +17,7 @@ from mongoengine_migrate.graph import MigrationPolicy
 from mongoengine_migrate.mongo import check_empty_result
 from mongoengine_migrate.schema import Schema
 from mongoengine_migrate.utils import get_closest_parent, document_type_to_class_name, Diff, UNSET
-from .registry import CONVERTION_MATRIX
+from . import registry
 from ..updater import ByPathContext, ByDocContext, DocumentUpdater
 
 
@@ -328,15 +328,13 @@ class CommonFieldHandler(metaclass=FieldHandlerMeta):
         :return:
         """
 
-        type_converters = CONVERTION_MATRIX.get(from_field_cls) or \
-            CONVERTION_MATRIX.get(get_closest_parent(from_field_cls, CONVERTION_MATRIX.keys()))
-
-        if type_converters is None:
-            raise MigrationError(f'Type converter not found for convertion '
-                                 f'{from_field_cls!r} -> {to_field_cls!r}')
-
-        type_converter = type_converters.get(to_field_cls) or \
-            type_converters.get(get_closest_parent(to_field_cls, type_converters))
+        # Type keys are mongoengine field class names
+        type_converter = registry.CONVERTION_MATRIX_BY_NAME.get(
+            (from_field_cls.__name__, to_field_cls.__name__)
+        )
+        if type_converter is None:
+            # Field class was added to registry after matrix was built
+            type_converter = registry.resolve_converter(from_field_cls, to_field_cls)
 
         if type_converter is None:
             raise MigrationError(f'Type converter not found for convertion '
@@ -3,18 +3,21 @@ __all__ = [
     'type_key_registry',
     'add_type_key',
     'add_field_handler',
-    'CONVERTION_MATRIX'
+    'CONVERTION_MATRIX',
+    'resolve_converter',
+    'clear_convertion_cache'
 ]
 
 import decimal
-import inspect
 from datetime import datetime, date
-from functools import partial
-from typing import Dict, Type, Optional, NamedTuple
+from functools import partial, lru_cache
+from types import MappingProxyType
+from typing import Dict, Type, Optional, NamedTuple, Callable, Set, Mapping, Tuple
 
 import bson
 from mongoengine import fields
 
+from mongoengine_migrate.utils import get_closest_parent
 from . import converters
 
 
@@ -148,6 +151,13 @@ class TypeKeyRegistryItem(NamedTuple):
 #: there is used handler associated with this field or CommonFieldHander
 type_key_registry: Dict[str, TypeKeyRegistryItem] = {}
 
+# Type keys which field classes are derived from field class of
+# a type key (including itself). {type_key: {derived_type_key, ...}}
+_derived_type_keys: Dict[str, Set[str]] = {}
+
+# Type keys without handler set
+_unhandled_type_keys: Set[str] = set()
+
 
 def add_type_key(field_cls: Type[fields.BaseField]):
     """
@@ -155,11 +165,22 @@ def add_type_key(field_cls: Type[fields.BaseField]):
     :param field_cls: mongoengine field class
     :return:
     """
-    assert inspect.isclass(field_cls) and issubclass(field_cls, fields.BaseField), \
+    assert isinstance(field_cls, type) and issubclass(field_cls, fields.BaseField), \
         f'{field_cls!r} is not a class derived from BaseField'
 
-    type_key_registry[field_cls.__name__] = TypeKeyRegistryItem(field_cls=field_cls,
-                                                                field_handler_cls=None)
+    type_key = field_cls.__name__
+    type_key_registry[type_key] = TypeKeyRegistryItem(field_cls=field_cls,
+                                                      field_handler_cls=None)
+    _unhandled_type_keys.add(type_key)
+
+    _derived_type_keys[type_key] = set()
+    for other_type_key, registry_item in type_key_registry.items():
+        if issubclass(registry_item.field_cls, field_cls):
+            _derived_type_keys[type_key].add(other_type_key)
+        if issubclass(field_cls, registry_item.field_cls):
+            _derived_type_keys[other_type_key].add(type_key)
+
+    clear_convertion_cache()
 
 
 def add_field_handler(field_cls: Type[fields.BaseField], handler_cls: Type['CommonFieldHandler']):
@@ -176,47 +197,37 @@ def add_field_handler(field_cls: Type[fields.BaseField], handler_cls: Type['Comm
     # Handlers can be added in any order
     # So set a handler only on those registry items where no handler
     # was set or where handler is a base class of given one
-    for type_key, registry_item in type_key_registry.items():
-        current_handler = registry_item.field_handler_cls
-        if current_handler is None or issubclass(registry_item.field_cls, field_cls):
-            type_key_registry[type_key] = TypeKeyRegistryItem(
-                field_cls=registry_item.field_cls,
-                field_handler_cls=handler_cls
-            )
-
-
-# Fill out the type key registry with all mongoengine fields
-for name, member in inspect.getmembers(fields):
-    if not inspect.isclass(member) or not issubclass(member, fields.BaseField):
-        continue
-
-    add_type_key(member)
+    for type_key in _derived_type_keys[field_cls.__name__] | _unhandled_type_keys:
+        type_key_registry[type_key] = type_key_registry[type_key]._replace(
+            field_handler_cls=handler_cls
+        )
+    _unhandled_type_keys.clear()
 
 
-DENY_BASES = {
+DENY_BASES = dict.fromkeys((
     # Do not set converters for BooleanField, DynamicField,
     # SequenceField since they are set below
-    fields.ObjectIdField: converters.deny,
-    fields.StringField: converters.deny,   # + URLField, EmailField, ComplexDateTimeField
-    fields.IntField: converters.deny,
-    fields.LongField: converters.deny,
-    fields.FloatField: converters.deny,
-    fields.DecimalField: converters.deny,
-    fields.DateTimeField: converters.deny,  # + DateField, ComplexDateTimeField
-    fields.EmbeddedDocumentField: converters.deny,
-    fields.GenericEmbeddedDocumentField: converters.deny,
-    fields.ListField: converters.deny,  # + EmbeddedDocumentListField, SortedListField
-    fields.DictField: converters.deny,  # + MapField
-    fields.ReferenceField: converters.deny,
-    fields.CachedReferenceField: converters.deny,
-    fields.GenericReferenceField: converters.deny,  # + GenericLazyReferenceField
-    fields.BinaryField: converters.deny,
-    fields.FileField: converters.deny,  # + ImageField
-    fields.UUIDField: converters.deny,
-    fields.GeoPointField: converters.deny,
-    fields.GeoJsonBaseField: converters.deny,  # All geo fields except GeoPointField
-    fields.LazyReferenceField: converters.deny,
-}
+    fields.ObjectIdField,
+    fields.StringField,   # + URLField, EmailField, ComplexDateTimeField
+    fields.IntField,
+    fields.LongField,
+    fields.FloatField,
+    fields.DecimalField,
+    fields.DateTimeField,  # + DateField, ComplexDateTimeField
+    fields.EmbeddedDocumentField,
+    fields.GenericEmbeddedDocumentField,
+    fields.ListField,  # + EmbeddedDocumentListField, SortedListField
+    fields.DictField,  # + MapField
+    fields.ReferenceField,
+    fields.CachedReferenceField,
+    fields.GenericReferenceField,  # + GenericLazyReferenceField
+    fields.BinaryField,
+    fields.FileField,  # + ImageField
+    fields.UUIDField,
+    fields.GeoPointField,
+    fields.GeoJsonBaseField,  # All geo fields except GeoPointField
+    fields.LazyReferenceField,
+), converters.deny)
 
 
 COMMON_CONVERTERS = {
@@ -248,8 +259,28 @@ OBJECTID_CONVERTERS = {
 }
 
 
+#: Converters which are set in every row of convertion matrix if
+#: a row does not set them explicitly
+DEFAULT_CONVERTERS = {
+    # Fallback converter for unknown fields
+    fields.BaseField: converters.nothing,
+    # Any db value can get casted to boolean
+    fields.BooleanField: converters.to_bool,
+    # Drop field during convertion to SequenceField
+    fields.SequenceField: converters.drop_field,
+    # DynamicField can keep any type of value
+    fields.DynamicField: converters.nothing,
+}
+
+# Read-only rows which are shared between several field types
+# in convertion matrix
+COMMON_ROW = MappingProxyType({**DEFAULT_CONVERTERS, **COMMON_CONVERTERS})
+OBJECTID_ROW = MappingProxyType({**DEFAULT_CONVERTERS, **OBJECTID_CONVERTERS})
+
+
 def get_geojson_converters(from_type):
-    return {
+    return MappingProxyType({
+        **DEFAULT_CONVERTERS,
         **DENY_BASES,
         fields.ListField: converters.item_to_list,
         fields.EmbeddedDocumentListField: converters.deny,  # Override ListField converter
@@ -285,7 +316,7 @@ def get_geojson_converters(from_type):
             from_type=from_type,
             to_type='MultiPolygon'
         ),
-    }
+    })
 
 
 #: Field type convertion matrix
@@ -295,7 +326,11 @@ def get_geojson_converters(from_type):
 #:
 #: Types are searched here either as exact class equality or the nearest
 #: parent. If type pair is not exists in matrix, then such convertion
-#: is denied.
+#: is denied. Convertion between a class and its parent/child class
+#: does nothing, see `resolve_converter`.
+#:
+#: Matrix rows are read-only, the same row object can be shared
+#: between several field types.
 #:
 #: Deny convertion from unknown general dicts to embedded documents,
 #: manual ref, dynamic document, geojson fields because these dicts
@@ -305,8 +340,9 @@ def get_geojson_converters(from_type):
 #: Format: {field_type1: {field_type2: converter_function, ...}, ...}
 #:
 CONVERTION_MATRIX = {
-    fields.ObjectIdField: OBJECTID_CONVERTERS.copy(),
-    fields.StringField: {
+    fields.ObjectIdField: OBJECTID_ROW,
+    fields.StringField: MappingProxyType({
+        **DEFAULT_CONVERTERS,
         **COMMON_CONVERTERS,
         fields.ObjectIdField: converters.to_object_id,
         fields.URLField: partial(converters.to_url_string, check_only=True),
@@ -316,19 +352,21 @@ CONVERTION_MATRIX = {
         fields.FileField: converters.to_object_id,  # + ImageField
         fields.UUIDField: converters.to_uuid_str,
         fields.LazyReferenceField: converters.to_dbref,
-    },
-    fields.IntField: COMMON_CONVERTERS.copy(),
-    fields.LongField: COMMON_CONVERTERS.copy(),
-    fields.FloatField: COMMON_CONVERTERS.copy(),
-    fields.DecimalField: COMMON_CONVERTERS.copy(),
-    fields.BooleanField: {
+    }),
+    fields.IntField: COMMON_ROW,
+    fields.LongField: COMMON_ROW,
+    fields.FloatField: COMMON_ROW,
+    fields.DecimalField: COMMON_ROW,
+    fields.BooleanField: MappingProxyType({
+        **DEFAULT_CONVERTERS,
         **COMMON_CONVERTERS,
         fields.DateTimeField: converters.deny,
         fields.ComplexDateTimeField: converters.deny
-    },
-    fields.DateTimeField: COMMON_CONVERTERS.copy(),
+    }),
+    fields.DateTimeField: COMMON_ROW,
 
-    fields.EmbeddedDocumentField: {
+    fields.EmbeddedDocumentField: MappingProxyType({
+        **DEFAULT_CONVERTERS,
         # Forbid convertion to DynamicField since it requires
         # to be dynamic document (with '_cls' dict key) if it contains
         # embedded document
@@ -338,16 +376,18 @@ CONVERTION_MATRIX = {
         fields.EmbeddedDocumentListField: converters.item_to_list,
         fields.DictField: converters.nothing,  # + MapField
         fields.ReferenceField: converters.deny,  # TODO: convert reference to embedded
-    },
-    fields.GenericEmbeddedDocumentField: {
+    }),
+    fields.GenericEmbeddedDocumentField: MappingProxyType({
+        **DEFAULT_CONVERTERS,
         **DENY_BASES,
         fields.EmbeddedDocumentField: converters.remove_cls_key,
         fields.ListField: converters.item_to_list,
         fields.EmbeddedDocumentListField: partial(converters.item_to_list, remove_cls_key=True),
         fields.DictField: converters.nothing,  # + MapField
-    },
+    }),
 
-    fields.DynamicField: {
+    fields.DynamicField: MappingProxyType({
+        **DEFAULT_CONVERTERS,
         **COMMON_CONVERTERS,
         fields.ObjectIdField: converters.to_object_id,
         fields.URLField: converters.to_url_string,
@@ -360,8 +400,9 @@ CONVERTION_MATRIX = {
         fields.FileField: converters.to_object_id,
         fields.UUIDField: converters.to_uuid_str,
         fields.LazyReferenceField: converters.to_dbref,
-    },
-    fields.ListField: {
+    }),
+    fields.ListField: MappingProxyType({
+        **DEFAULT_CONVERTERS,
         **DENY_BASES,
         fields.ObjectIdField: partial(converters.extract_from_list, bson.ObjectId),
         fields.StringField: partial(converters.extract_from_list, str),
@@ -378,24 +419,27 @@ CONVERTION_MATRIX = {
         fields.FileField: partial(converters.extract_from_list, bson.ObjectId),
         fields.LazyReferenceField: partial(converters.extract_from_list,
                                            (bson.ObjectId, bson.DBRef)),
-    },
-    fields.EmbeddedDocumentListField: {
+    }),
+    fields.EmbeddedDocumentListField: MappingProxyType({
+        **DEFAULT_CONVERTERS,
         **DENY_BASES,
         fields.EmbeddedDocumentField: partial(converters.extract_from_list, dict),
         fields.ListField: converters.nothing,
         fields.DictField: partial(converters.extract_from_list, dict),  # + MapField
-    },
+    }),
     # Forbid convertion for DictField almost everywhere because
     # typically a dict has unknown structure
-    fields.DictField: {
+    fields.DictField: MappingProxyType({
+        **DEFAULT_CONVERTERS,
         **DENY_BASES,
         fields.ListField: converters.item_to_list,
         # Override ListField
         fields.EmbeddedDocumentListField: converters.deny,
-    },
+    }),
 
-    fields.ReferenceField: OBJECTID_CONVERTERS.copy(),
-    fields.CachedReferenceField: {
+    fields.ReferenceField: OBJECTID_ROW,
+    fields.CachedReferenceField: MappingProxyType({
+        **DEFAULT_CONVERTERS,
         **DENY_BASES,
         fields.ObjectIdField: converters.to_object_id,
         fields.ListField: converters.item_to_list,
@@ -406,21 +450,24 @@ CONVERTION_MATRIX = {
         fields.GenericReferenceField: converters.to_dbref,  # + GenericLazyReferenceField
         fields.FileField: converters.to_object_id,
         fields.LazyReferenceField: converters.to_dbref,
-    },
-    fields.GenericReferenceField: OBJECTID_CONVERTERS.copy(),  # + GenericLazyReferenceField
+    }),
+    fields.GenericReferenceField: OBJECTID_ROW,  # + GenericLazyReferenceField
 
     # BinaryField has unknown binary data which more likely
     # will not be decoded into one of value
     # User can write his own action using RunPython to convert it
-    fields.BinaryField: {
+    fields.BinaryField: MappingProxyType({
+        **DEFAULT_CONVERTERS,
         **DENY_BASES,
-    },
-    fields.FileField: OBJECTID_CONVERTERS.copy(),
+    }),
+    fields.FileField: OBJECTID_ROW,
     # Sequence field just points to another counter field, so do nothing
-    fields.SequenceField: {
+    fields.SequenceField: MappingProxyType({
+        **DEFAULT_CONVERTERS,
         fields.BaseField: converters.nothing
-    },
-    fields.UUIDField: {
+    }),
+    fields.UUIDField: MappingProxyType({
+        **DEFAULT_CONVERTERS,
         **DENY_BASES,
         fields.StringField: converters.to_string,
         fields.URLField: converters.deny,  # Override StringField converter
@@ -429,10 +476,11 @@ CONVERTION_MATRIX = {
         fields.ListField: converters.item_to_list,
         fields.EmbeddedDocumentListField: converters.deny,   # Override ListField converter
         fields.BinaryField: converters.to_uuid_bin,
-    },
+    }),
 
     # Geo fields
-    fields.GeoPointField: {
+    fields.GeoPointField: MappingProxyType({
+        **DEFAULT_CONVERTERS,
         **DENY_BASES,
         fields.ListField: converters.item_to_list,
         fields.EmbeddedDocumentListField: converters.deny,   # Override ListField converter
@@ -445,7 +493,7 @@ CONVERTION_MATRIX = {
                                              to_type='MultiLineString'),
         fields.MultiPolygonField: partial(converters.legacy_pairs_to_geojson,
                                           to_type='MultiPolygon'),
-    },
+    }),
     fields.PointField: get_geojson_converters('Point'),
     fields.LineStringField: get_geojson_converters('LineString'),
     fields.PolygonField: get_geojson_converters('Polygon'),
@@ -453,27 +501,87 @@ CONVERTION_MATRIX = {
     fields.MultiLineStringField: get_geojson_converters('MultiLineString'),
     fields.MultiPolygonField: get_geojson_converters('MultiPolygonField'),
 
-    fields.LazyReferenceField: OBJECTID_CONVERTERS.copy(),
+    fields.LazyReferenceField: OBJECTID_ROW,
 
     # Leave field as is if field type is unknown
-    fields.BaseField: {}
+    fields.BaseField: MappingProxyType({**DEFAULT_CONVERTERS})
 }
 
 
-for klass, converters_mapping in CONVERTION_MATRIX.items():
-    # Add fallback converter for unknown fields
-    CONVERTION_MATRIX[klass].setdefault(fields.BaseField, converters.nothing)
+@lru_cache(maxsize=None)
+def resolve_converter(from_field_cls: Type[fields.BaseField],
+                      to_field_cls: Type[fields.BaseField]) -> Optional[Callable]:
+    """
+    Find converter in convertion matrix for a given field types pair.
+    Results are cached, see `clear_convertion_cache`
+    :param from_field_cls: mongoengine field class which was used
+     before
+    :param to_field_cls: mongoengine field class which will be used
+     further
+    :return: converter function or None if not found
+    """
+    row_cls = from_field_cls if from_field_cls in CONVERTION_MATRIX \
+        else get_closest_parent(from_field_cls, CONVERTION_MATRIX)
+    if row_cls is None:
+        return None
 
-    # Add boolean converter for all fields
-    # Any db value can get casted to boolean
-    CONVERTION_MATRIX[klass].setdefault(fields.BooleanField, converters.to_bool)
+    type_converters = CONVERTION_MATRIX[row_cls]
 
-    # Drop field during convertion to SequenceField
-    CONVERTION_MATRIX[klass].setdefault(fields.SequenceField, converters.drop_field)
+    # Convertion between class and its parent/child class does nothing.
+    # Row class is not kept in row itself since rows are shared, so
+    # treat it as an implicit row key
+    if to_field_cls is row_cls:
+        return converters.nothing
+    if to_field_cls in type_converters:
+        return type_converters[to_field_cls]
+
+    to_cls = get_closest_parent(to_field_cls, (*type_converters, row_cls))
+    if to_cls is row_cls:
+        return converters.nothing
+
+    return type_converters.get(to_cls)
+
+
+def _build_convertion_matrix_by_name() -> Mapping[Tuple[str, str], Callable]:
+    return MappingProxyType({
+        (from_type_key, to_type_key): resolve_converter(from_item.field_cls, to_item.field_cls)
+        for from_type_key, from_item in type_key_registry.items()
+        for to_type_key, to_item in type_key_registry.items()
+    })
+
+
+def clear_convertion_cache():
+    """
+    Drop resolved converters cache and `CONVERTION_MATRIX_BY_NAME`,
+    which will be rebuilt on next access. Called on type key
+    registration. Must be called after `CONVERTION_MATRIX` is changed
+    """
+    resolve_converter.cache_clear()
+    globals().pop('CONVERTION_MATRIX_BY_NAME', None)
 
-    # Add DynamicField converter for all fields since it can keep any
-    # type of value
-    CONVERTION_MATRIX[klass].setdefault(fields.DynamicField, converters.nothing)
 
-    # Force set convertion between class and its parent/child class
-    CONVERTION_MATRIX[klass][klass] = converters.nothing
+def __getattr__(name):
+    # Convertion matrix by names is built on first access since it is
+    # not needed for most of commands
+    if name == 'CONVERTION_MATRIX_BY_NAME':
+        res = globals()[name] = _build_convertion_matrix_by_name()
+        return res
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+#: Convertion matrix resolved for every type key pair from type_key
+#: registry. Lookups here do not require class hierarchy traversing.
+#: Built lazily on first access and after `clear_convertion_cache`
+#:
+#: Format: {(from_type_key, to_type_key): converter_function, ...}
+CONVERTION_MATRIX_BY_NAME: Mapping[Tuple[str, str], Callable]
+
+
+# Fill out the type key registry with all mongoengine fields.
+# Done at the end since add_type_key clears the convertion cache
+for name, member in list(vars(fields).items()):
+    if not isinstance(member, type) or not issubclass(member, fields.BaseField):
+        continue
+
+    add_type_key(member)
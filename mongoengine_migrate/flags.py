@@ -1,7 +1,7 @@
 """This module contains flags setting on starting, via command line
 for example
 """
-from typing import Optional
+from typing import Optional, Final
 
 import pymongo
 from pymongo.database import Database
@@ -26,22 +26,22 @@ database2: Optional[Database] = None
 
 #: If this prefix contains in collection name then this document
 #: is considered as embedded
-EMBEDDED_DOCUMENT_NAME_PREFIX = '~'
+EMBEDDED_DOCUMENT_NAME_PREFIX: Final = '~'
 
 
 #: Separator between parent and clild classes in document name string
-DOCUMENT_NAME_SEPARATOR = '->'
+DOCUMENT_NAME_SEPARATOR: Final = '->'
 
 
 #: Maximum memory items buffer size on bulk write operations
 #: Pay attention: max BSON size is 16Mb
 #: https://docs.mongodb.com/manual/reference/limits/#bson-documents
-BULK_BUFFER_LENGTH = 10000
+BULK_BUFFER_LENGTH: Final = 10000
 
 
 #: Separator which separates parts in index name
-INDEX_NAME_SEPARATOR = '_'
+INDEX_NAME_SEPARATOR: Final = '_'
 
 #: Default field index type if no type explicitly set
 #: See mongoengine code
-DEFAULT_INDEX_TYPE = pymongo.ASCENDING
+DEFAULT_INDEX_TYPE: Final = pymongo.ASCENDING
@@ -4,10 +4,12 @@ __all__ = [
     'MigrationsGraph'
 ]
 
-from typing import Dict, List
+import sys
+from operator import attrgetter
+from typing import Dict, List, Set
 
 from mongoengine_migrate.exceptions import MigrationGraphError
-from mongoengine_migrate.utils import Slotinit
+from mongoengine_migrate.utils import Slotinit, UNSET
 from enum import Enum
 
 
@@ -36,27 +38,58 @@ class MigrationPolicy(Enum):
     relaxed = 1
 
 
+_POLICY_BY_NAME = {m.name: m for m in MigrationPolicy}
+
+
 class Migration(Slotinit):
     """Object represents one migration
 
     Contains information which is set in migration:
-    * name -- migration file name without '.py' suffix
-    * dependencies -- name list of migrations which this migration is
-      dependent by
+    * name -- migration file name without '.py' suffix. Interned
+    * dependencies -- names of migrations which this migration is
+      dependent by. Kept as frozenset of interned strings
     * applied -- is migration was applied or not. Taken from database
     """
-    __slots__ = ('name', 'dependencies', 'applied', 'module')
-    defaults = {'applied': False}
+    __slots__ = ('name', 'dependencies', 'applied', 'module', '_policy')
+    defaults = {'applied': False, '_policy': UNSET}
+    _get_slots = attrgetter('name', 'dependencies', 'applied', 'module')
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Names are used as graph dict keys, so intern them
+        if 'name' in kwargs:
+            self.name = sys.intern(kwargs['name'])
+        if 'dependencies' in kwargs:
+            self.dependencies = frozenset(map(sys.intern, kwargs['dependencies']))
 
     def get_actions(self):
         # FIXME: type checking, attribute checking
         # FIXME: tests
         return self.module.actions
 
+    def __eq__(self, other):
+        # Compare slot values as tuples instead of one by one.
+        # Cached policy is not compared
+        if self is other:
+            return True
+        if not isinstance(other, Migration):
+            return False
+
+        try:
+            return self._get_slots(self) == other._get_slots(other)
+        except AttributeError:
+            return False
+
     @property
     def policy(self) -> MigrationPolicy:
-        attr = getattr(self.module, 'policy', MigrationPolicy.strict.name)
-        return getattr(MigrationPolicy, attr)
+        # Cached on first access, module is not supposed to be changed.
+        # Kept in a slot since functools.cached_property needs instance
+        # __dict__ which is absent because of __slots__
+        if self._policy is UNSET:
+            self._policy = _POLICY_BY_NAME.get(getattr(self.module, 'policy', None),
+                                               MigrationPolicy.strict)
+
+        return self._policy
 
 
 class MigrationsGraph:
@@ -67,21 +100,53 @@ class MigrationsGraph:
         self._parents: Dict[str, List[Migration]] = {}  # {child_name: [parent_obj...]}
         self._children: Dict[str, List[Migration]] = {}  # {parent_name: [child_obj...]}
 
+        # Lengths of lists above, used by traversing
+        self._parent_counts: Dict[str, int] = {}  # {child_name: parents_count}
+        self._child_counts: Dict[str, int] = {}  # {parent_name: children_count}
+
+        # Names of migrations in lists above
+        self._parent_names: Dict[str, Set[str]] = {}  # {child_name: {parent_name...}}
+        self._child_names: Dict[str, Set[str]] = {}  # {parent_name: {child_name...}}
+
+        # Names of migrations which depend on a migration, including
+        # not added ones. In order of adding
+        self._dependents: Dict[str, List[str]] = {}  # {dependency_name: [migration_name...]}
+        # Position of migration in order of adding
+        self._positions: Dict[str, int] = {}  # {migration_name: number}
+
         self._migrations: Dict[str, Migration] = {}  # {migration_name: migration_obj}
 
+        # Cached `initial` and `last` values, reset on graph change
+        self._initial = UNSET
+        self._last = UNSET
+
+        # Cached walk orders, reset on graph change
+        self._down_orders: Dict[str, List[Migration]] = {}  # {from_node_name: [migration_obj...]}
+        self._up_orders: Dict[str, List[Migration]] = {}  # {from_node_name: [migration_obj...]}
+
     @property
     def initial(self):
         """Return initial migration object"""
-        for name, parents in self._parents.items():
-            if not parents:
-                return self._migrations[name]
+        if self._initial is UNSET:
+            self._initial = next(
+                (self._migrations[name] for name, count in self._parent_counts.items()
+                 if not count),
+                None
+            )
+
+        return self._initial
 
     @property
     def last(self):
         """Return last children migration object"""
-        for name, children in self._children.items():
-            if not children:
-                return self._migrations[name]
+        if self._last is UNSET:
+            self._last = next(
+                (self._migrations[name] for name, count in self._child_counts.items()
+                 if not count),
+                None
+            )
+
+        return self._last
 
     @property
     def migrations(self):
@@ -95,20 +160,58 @@ class MigrationsGraph:
         :param migration: Migration object
         :return:
         """
-        self._parents[migration.name] = []
-        self._children[migration.name] = []
-
-        for partner in self._migrations.values():
-            if partner.name == migration.name:
-                continue
-            if partner.name in migration.dependencies:
-                self._parents[migration.name].append(partner)
-                self._children[partner.name].append(migration)
-            if migration.name in partner.dependencies:
-                self._children[migration.name].append(partner)
-                self._parents[partner.name].append(migration)
-
-        self._migrations[migration.name] = migration
+        name = migration.name
+        if name in self._migrations:
+            self._remove_edges(self._migrations[name])
+        self._initial = self._last = UNSET
+        self._down_orders = {}
+        self._up_orders = {}
+
+        dependencies = migration.dependencies - {name}
+        self._positions.setdefault(name, len(self._positions))
+
+        # Keep parents in order of adding
+        parents = sorted(
+            (self._migrations[dep] for dep in dependencies if dep in self._migrations),
+            key=lambda x: self._positions[x.name]
+        )
+        children = [self._migrations[x] for x in self._dependents.get(name, ())]
+
+        self._parents[name] = parents
+        self._children[name] = children
+        self._parent_counts[name] = len(parents)
+        self._child_counts[name] = len(children)
+        self._parent_names[name] = {x.name for x in parents}
+        self._child_names[name] = {x.name for x in children}
+
+        for parent in parents:
+            self._children[parent.name].append(migration)
+            self._child_counts[parent.name] += 1
+            self._child_names[parent.name].add(name)
+        for child in children:
+            self._parents[child.name].append(migration)
+            self._parent_counts[child.name] += 1
+            self._parent_names[child.name].add(name)
+        for dep in dependencies:
+            self._dependents.setdefault(dep, []).append(name)
+
+        self._migrations[name] = migration
+
+    def _remove_edges(self, migration: Migration):
+        """Remove edges of a given migration from the graph"""
+        name = migration.name
+        for parent in self._parents[name]:
+            self._children[parent.name] = [x for x in self._children[parent.name]
+                                           if x is not migration]
+            self._child_counts[parent.name] = len(self._children[parent.name])
+            self._child_names[parent.name].discard(name)
+        for child in self._children[name]:
+            self._parents[child.name] = [x for x in self._parents[child.name]
+                                         if x is not migration]
+            self._parent_counts[child.name] = len(self._parents[child.name])
+            self._parent_names[child.name].discard(name)
+        for dep in migration.dependencies - {name}:
+            self._dependents[dep].remove(name)
 
     def clear(self):  # TODO: tests
         """
@@ -117,12 +220,21 @@ class MigrationsGraph:
         """
         self._parents = {}
         self._children = {}
+        self._parent_counts = {}
+        self._child_counts = {}
+        self._parent_names = {}
+        self._child_names = {}
+        self._dependents = {}
+        self._positions = {}
         self._migrations = {}
+        self._initial = self._last = UNSET
+        self._down_orders = {}
+        self._up_orders = {}
 
     def verify(self):
         """
         Verify migrations graph to be satisfied to consistency rules
-        Graph must not have loops, disconnections.
+        Graph must not have loops, closed cycles, disconnections.
         Also it should have single initial migration and (for a while)
         single last migration.
         :raises MigrationGraphError: if problem in graph was found
@@ -137,10 +249,10 @@ class MigrationsGraph:
                 initials.append(name)
             if not self._children[name]:
                 last_children.append(name)
-            if len(obj.dependencies) > len(self._parents[name]):
-                diff = set(obj.dependencies) - {x.name for x in self._parents[name]}
+            if len(obj.dependencies) > self._parent_counts[name]:
+                diff = set(obj.dependencies - self._parent_names[name])
                 raise MigrationGraphError(f'Unknown dependencies in migration {name!r}: {diff}')
-            if name in (x.name for x in self._children[name]):
+            if name in self._child_names[name]:
                 raise MigrationGraphError(f'Found migration which dependent on itself: {name!r}')
 
         if len(initials) == len(last_children) and len(initials) > 1:
@@ -155,7 +267,12 @@ class MigrationsGraph:
         if not initials or not last_children:
             raise MigrationGraphError(f'No initial or last children found')
 
-    def walk_down(self, from_node: Migration, unapplied_only=True, _node_counters=None):
+        # Migrations in a closed cycle never become ready during a walk
+        walked = sum(1 for _ in self._walk(self.initial, self._parent_counts, self._children))
+        if walked < len(self._migrations):
+            raise MigrationGraphError('Found closed cycle in migration graph')
+
+    def walk_down(self, from_node: Migration, unapplied_only=True):
         """
         Walks down over migrations graph. Iterates in order as migrations
         should be applied.
@@ -180,40 +297,32 @@ class MigrationsGraph:
         If counter > 0 after that then don't touch this node and
         break traversing on this depth and go up. If counter == 0 then
         continue traversing.
+
+        DFS is performed iteratively using a stack of children
+        iterators instead of recursion. Walk order is computed once
+        and cached until the graph is changed
         :param from_node: current node in graph
         :param unapplied_only: if True then return only unapplied migrations
          or return all migrations otherwise
-        :param _node_counters:
         :raises MigrationGraphError: if graph has a closed cycle
         :return: Migration objects generator
         """
         # FIXME: may yield nodes not related to target migration if branchy graph
         #        if migration was applied after its dependencies unapplied then it is an error
         #        should have stable migrations order
-        if _node_counters is None:
-            _node_counters = {}
         if from_node is None:
-            return ()
-        _node_counters.setdefault(from_node.name, len(self._parents[from_node.name]) or 1)
-        _node_counters[from_node.name] -= 1
-
-        if _node_counters[from_node.name] > 0:
-            # Stop on this depth if not all parents has been viewed
             return
 
-        if _node_counters[from_node.name] < 0:
-            # A node was already returned and we're reached it again
-            # This means there is a closed cycle
-            raise MigrationGraphError(f'Found closed cycle in migration graph, '
-                                      f'{from_node.name!r} is repeated twice')
+        order = self._down_orders.get(from_node.name)
+        if order is None:
+            order = list(self._walk(from_node, self._parent_counts, self._children))
+            self._down_orders[from_node.name] = order
 
-        if not (from_node.applied and unapplied_only):
-            yield from_node
+        for node in order:
+            if not (node.applied and unapplied_only):
+                yield node
 
-        for child in self._children[from_node.name]:
-            yield from self.walk_down(child, unapplied_only, _node_counters)
-
-    def walk_up(self, from_node: Migration, applied_only=True, _node_counters=None):
+    def walk_up(self, from_node: Migration, applied_only=True):
         """
         Walks up over migrations graph. Iterates in order as migrations
         should be reverted.
@@ -228,34 +337,64 @@ class MigrationsGraph:
         :param from_node:  last children node we are starting for
         :param applied_only: if True then return only applied migrations,
          return all migrations otherwise
-        :param _node_counters:
         :raises MigrationGraphError: if graph has a closed cycle
         :return: Migration objects generator
         """
         # FIXME: may yield nodes not related to reverting if branchy graph
         #        if migration was unapplied before its dependencies applied then it is an error
-        if _node_counters is None:
-            _node_counters = {}
         if from_node is None:
-            return ()
-        _node_counters.setdefault(from_node.name, len(self._children[from_node.name]) or 1)
-        _node_counters[from_node.name] -= 1
-
-        if _node_counters[from_node.name] > 0:
-            # Stop in this depth if not all children has been viewed
             return
 
-        if _node_counters[from_node.name] < 0:
-            # A node was already returned and we're reached it again
-            # This means there is a closed cycle
-            raise MigrationGraphError(f'Found closed cycle in migration graph, '
-                                      f'{from_node.name!r} is repeated twice')
+        order = self._up_orders.get(from_node.name)
+        if order is None:
+            order = list(self._walk(from_node, self._child_counts, self._parents))
+            self._up_orders[from_node.name] = order
+
+        for node in order:
+            if node.applied or not applied_only:
+                yield node
+
+    @staticmethod
+    def _walk(from_node: Migration,
+              incoming_counts: Dict[str, int],
+              outgoing: Dict[str, List[Migration]]):
+        """
+        Iterative modified DFS over migrations graph, see `walk_down`.
+        A node is returned only after it was reached by all its
+        incoming edges
+        :param from_node: node to start from
+        :param incoming_counts: incoming edges count of each node
+        :param outgoing: outgoing edges of each node
+        :raises MigrationGraphError: if graph has a closed cycle
+        :return: Migration objects generator
+        """
+        # Counters are copied at once, so every visit costs
+        # one lookup and one store
+        node_counters = dict(incoming_counts)
+        node_counters[from_node.name] = node_counters[from_node.name] or 1
+        stack = [iter((from_node, ))]
+        while stack:
+            node = next(stack[-1], None)
+            if node is None:
+                stack.pop()
+                continue
+
+            name = node.name
+            counter = node_counters[name] - 1
+            node_counters[name] = counter
+
+            if counter > 0:
+                # Stop on this depth if not all incoming edges has been viewed
+                continue
 
-        if from_node.applied or not applied_only:
-            yield from_node
+            if counter < 0:
+                # A node was already returned and we're reached it again
+                # This means there is a closed cycle
+                raise MigrationGraphError(f'Found closed cycle in migration graph, '
+                                          f'{name!r} is repeated twice')
 
-        for child in self._parents[from_node.name]:
-            yield from self.walk_up(child, applied_only, _node_counters)
+            yield node
+            stack.append(iter(outgoing[name]))
 
     def __iter__(self):
         return iter(self.walk_down(self.initial, unapplied_only=False))
@@ -264,7 +403,9 @@ class MigrationsGraph:
         return iter(self.walk_up(self.last, applied_only=False))
 
     def __contains__(self, migration: Migration):
-        return migration in self._migrations.values()
+        # Migrations are keyed by name. Equal migrations have equal names
+        graph_migration = self._migrations.get(migration.name)
+        return graph_migration is not None and graph_migration == migration
 
     def __eq__(self, other):
         if other is self:
@@ -272,7 +413,9 @@ class MigrationsGraph:
         if not isinstance(other, MigrationsGraph):
             return False
 
-        return all(migr == other._migrations.get(name) for name, migr in self._migrations.items())
+        # Dict comparison checks length first and then compares
+        # migrations with the same names
+        return self._migrations == other._migrations
 
     def __ne__(self, other):
         return not self.__eq__(other)
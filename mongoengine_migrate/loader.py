@@ -7,22 +7,23 @@ __all__ = [
 import functools
 import importlib.util
 import logging
-import random
+import os
 import re
-import string
+import secrets
+import sys
+from copy import deepcopy
 from datetime import timezone, datetime
 from pathlib import Path
 from types import ModuleType
-from typing import Tuple, Dict, List, Type, Optional, Iterable
+from typing import Tuple, Dict, List, Type, Optional, Iterable, TYPE_CHECKING
 
 import pymongo.database
 import pymongo.errors
 from bson import CodecOptions
 from dictdiffer import patch, swap
-from jinja2 import Environment
 from mongoengine.base import _document_registry
 from mongoengine.document import Document, BaseDocument
-from pymongo import MongoClient
+from pymongo import MongoClient, ReplaceOne
 
 import mongoengine_migrate.flags as runtime_flags
 from mongoengine_migrate.actions.factory import build_actions_chain
@@ -33,12 +34,14 @@ from mongoengine_migrate.graph import Migration, MigrationsGraph, MigrationPolic
 from mongoengine_migrate.query_tracer import DatabaseQueryTracer
 from mongoengine_migrate.schema import Schema
 from mongoengine_migrate.utils import (
-    get_closest_parent,
     get_document_type,
     get_index_name,
     normalize_index_fields_spec
 )
 
+if TYPE_CHECKING:
+    import jinja2
+
 log = logging.getLogger('mongoengine-migrate')
 
 
@@ -53,18 +56,22 @@ def symbol_wrap(value: str, width: int = 80, wrap_by: str = ',', wrapstring: str
      newline
     :return: Wrapped string
     """
-    pos = 1
     lines = []
     content_width = width - len(wrapstring.replace('\n', ''))
-    while pos:
-        pos = value.rfind(wrap_by, 0, content_width) + 1 or None
-        if len(value) <= content_width:
-            lines.append(value)
+    # Scan the string by moving the line start position instead of
+    # copying the rest of string on every line
+    start = 0
+    value_len = len(value)
+    while value_len - start > content_width:
+        pos = value.rfind(wrap_by, start, start + content_width) + 1
+        if not pos:
             break
-        else:
-            lines.append(value[:pos])
-        value = value[pos:].lstrip(' \t')
+        lines.append(value[start:pos])
+        start = pos
+        while start < value_len and value[start] in ' \t':
+            start += 1
 
+    lines.append(value[start:])
     return wrapstring.join(lines)
 
 
@@ -76,16 +83,23 @@ def import_module(path: str) -> Tuple[ModuleType, str]:
     """
     attrs = []
     while 1:
+        # Probe module without executing it, so a failed probe
+        # has no side effects
         try:
+            spec = importlib.util.find_spec(path)
+        except ModuleNotFoundError:  # Parent is not a package or does not exist
+            spec = None
+
+        if spec is not None:
             module = importlib.import_module(path)
             rest = '.'.join(reversed(attrs))
             return module, rest
-        except ModuleNotFoundError as e:
-            try:
-                path, attr = path.rsplit('.', 1)
-            except ValueError:
-                raise MongoengineMigrateError(f"Cannot find module '{path}'") from e
-            attrs.append(attr)
+
+        try:
+            path, attr = path.rsplit('.', 1)
+        except ValueError:
+            raise MongoengineMigrateError(f"Cannot find module '{path}'")
+        attrs.append(attr)
 
 
 def collect_models_schema() -> Schema:
@@ -96,29 +110,39 @@ def collect_models_schema() -> Schema:
     schema = Schema()
     collections: Dict[str, set] = {}  # {collection_name: set(top_level_documents)}
 
+    # {field_cls: TypeKeyRegistryItem}
+    field_mapping_registry = {x.field_cls: x for x in type_key_registry.values()}
+    # Handlers of already seen field classes, {field_cls: handler_cls}
+    field_handlers = {}
+    embedded_prefix = runtime_flags.EMBEDDED_DOCUMENT_NAME_PREFIX
+    name_separator = runtime_flags.DOCUMENT_NAME_SEPARATOR
+
     # Retrieve models from mongoengine global document registry
     for model_cls in _document_registry.values():
-        log.debug('> Reading document %s', repr(model_cls))
+        log.debug('> Reading document %r', model_cls)
         # NOTE: EmbeddedDocuments are not append 'abstract' in meta if
         # `meta` is defined
         if model_cls._meta.get('abstract'):
-            log.debug('> Skip %s since it is an abstract document')
+            log.debug('> Skip %r since it is an abstract document', model_cls)
             continue
 
         document_type = get_document_type(model_cls)
         if document_type is None:
             raise ActionError(f'Could not get document type for {model_cls!r}')
+        # Document type is a key in schema and its patches. Field names
+        # are python identifiers, they are already interned
+        document_type = sys.intern(document_type)
 
         if document_type in schema:
             raise ActionError(f'Models with the same document types {document_type!r} found')
 
-        schema[document_type] = Schema.Document()
-        if not document_type.startswith(runtime_flags.EMBEDDED_DOCUMENT_NAME_PREFIX):
-            col = schema[document_type].parameters['collection'] = model_cls._get_collection_name()
+        document_schema = schema[document_type] = Schema.Document()
+        if not document_type.startswith(embedded_prefix):
+            col = document_schema.parameters['collection'] = model_cls._get_collection_name()
 
             # Determine if unrelated documents have the same collection
             # E.g. DropDocument could drop all of these documents
-            top_lvl_doc = document_type.split(runtime_flags.DOCUMENT_NAME_SEPARATOR)[0]
+            top_lvl_doc = document_type.partition(name_separator)[0]
             collections.setdefault(col, set())
             if collections[col] and top_lvl_doc not in collections[col]:
                 collections[col].add(top_lvl_doc)
@@ -128,16 +152,13 @@ def collect_models_schema() -> Schema:
                 collections[col].add(top_lvl_doc)
 
         if model_cls._meta.get('allow_inheritance'):
-            schema[document_type].parameters['inherit'] = True
+            document_schema.parameters['inherit'] = True
 
         if model_cls._dynamic:
-            schema[document_type].parameters['dynamic'] = True
+            document_schema.parameters['dynamic'] = True
 
         if issubclass(model_cls, Document):
-            schema[document_type].indexes.update(_extract_indexes(model_cls))
-
-        # {field_cls: TypeKeyRegistryItem}
-        field_mapping_registry = {x.field_cls: x for x in type_key_registry.values()}
+            document_schema.indexes.update(_extract_indexes(model_cls))
 
         # Collect schema for every field
         for field_name, field_obj in model_cls._fields.items():
@@ -148,23 +169,25 @@ def collect_models_schema() -> Schema:
 
             field_cls = field_obj.__class__
 
-            if field_cls in field_mapping_registry:
-                registry_field_cls = field_cls
-            else:
-                registry_field_cls = get_closest_parent(
-                    field_cls,
-                    field_mapping_registry.keys()
+            handler_cls = field_handlers.get(field_cls)
+            if handler_cls is None:
+                # The field class itself or its closest registered parent
+                registry_field_cls = next(
+                    (x for x in field_cls.__mro__ if x in field_mapping_registry),
+                    None
                 )
 
-            if registry_field_cls is None:
-                raise ActionError(f'Could not find {field_cls!r} or one of its base classes '
-                                  f'in type_key registry')
+                if registry_field_cls is None:
+                    raise ActionError(f'Could not find {field_cls!r} or one of its base classes '
+                                      f'in type_key registry')
+
+                handler_cls = field_mapping_registry[registry_field_cls].field_handler_cls
+                field_handlers[field_cls] = handler_cls
 
-            handler_cls = field_mapping_registry[registry_field_cls].field_handler_cls
-            schema[document_type][field_name] = handler_cls.build_schema(field_obj)
+            document_schema[field_name] = handler_cls.build_schema(field_obj)
             # TODO: validate default against all field restrictions such as min_length, regex, etc.
 
-        log.debug("> Schema '%s' => %s", document_type, str(schema[document_type]))
+        log.debug("> Schema '%s' => %s", document_type, document_schema)
 
     return schema
 
@@ -209,7 +232,9 @@ def _extract_indexes(model_cls: Type[BaseDocument]) -> Dict[str, dict]:
             log.warning("Index for fields %s was declared multiple times in %s document, replacing",
                         fields, model_cls.__name__)
 
-        indexes[index_name] = {**spec, 'fields': fields}
+        # `spec` is already a new dict, so reuse it
+        spec['fields'] = fields
+        indexes[index_name] = spec
 
     # If _cls field is being used (for polymorphism), it needs an index,
     # only if another index doesn't begin with _cls
@@ -221,8 +246,10 @@ def _extract_indexes(model_cls: Type[BaseDocument]) -> Dict[str, dict]:
                 "Auto-created index %s was declared manually in %s document, use another name",
                 index_name, model_cls.__name__
             )
-            # Append random letters to the end of name
-            index_name += '_' + ''.join(random.choice(string.ascii_letters) for _ in range(8))
+            # Append random suffix to the end of name
+            base_name = index_name
+            while index_name in indexes:
+                index_name = f'{base_name}_{secrets.token_hex(4)}'
 
         field_spec = list(normalize_index_fields_spec(['_cls']))
         indexes[index_name] = {'fields': field_spec, **global_spec}
@@ -230,6 +257,30 @@ def _extract_indexes(model_cls: Type[BaseDocument]) -> Dict[str, dict]:
     return indexes
 
 
+@functools.lru_cache(maxsize=1)
+def _get_migration_template() -> 'jinja2.Template':
+    """Return migration file template. Compiled on first call"""
+    # jinja2 is imported here since it is needed only by makemigrations
+    from jinja2 import Environment
+
+    env = Environment()
+    env.filters['symbol_wrap'] = symbol_wrap
+    tpl_path = Path(__file__).parent / 'migration_template.tpl'
+    return env.from_string(tpl_path.read_text())
+
+
+def _patch_schema(schema_patch: Iterable[tuple], schema: Schema) -> Schema:
+    """
+    Apply dictdiffer patch to a schema in place. Unlike copying a whole
+    schema on every patch, only the patch is copied, so the schema does
+    not share objects with the patch and its action
+    :param schema_patch: dictdiffer patch
+    :param schema: schema to be patched
+    :return: patched schema object
+    """
+    return patch(deepcopy(list(schema_patch)), schema, in_place=True)
+
+
 class MongoengineMigrate:
     default_collection_name: str = 'mongoengine_migrate'
     default_directory: str = './migrations'
@@ -284,7 +335,7 @@ class MongoengineMigrate:
 
         return db
 
-    @property
+    @functools.cached_property
     def migration_collection(self) -> pymongo.collection.Collection:
         """Return collection object where we keep migration data"""
         return self.client.get_database()[self.migrations_collection_name].with_options(
@@ -296,35 +347,23 @@ class MongoengineMigrate:
         Return iterable with migration names was written in db in
         applying order
         """
+        # There is only one migrations record, its items are written
+        # in applying order
         fltr = {'type': 'migrations'}
-        for migration in self.migration_collection.find(fltr).sort('ordering_number'):
-            return [m['name'] for m in migration['value']]
-
-        return []
+        res = self.migration_collection.find_one(fltr, projection={'value.name': 1, '_id': 0})
+        return [m['name'] for m in res.get('value', [])] if res else []
 
     def write_db_migrations_graph(self, graph: MigrationsGraph):
         """
         Write migrations graph to db
         :param graph: migrations graph
         """
-        fltr = {'type': 'migrations'}
-        records = []
-        num = 0
-        for migration in graph.walk_down(graph.initial, False):
-            if migration.applied:
-                records.append({
-                    'name': migration.name,
-                    'ordering_number': num
-                })
-                num += 1
-
-        data = {'type': 'migrations', 'value': records}
-        self.migration_collection.replace_one(fltr, data, upsert=True)
+        self.migration_collection.replace_one(*self._migrations_graph_record(graph), upsert=True)
 
     def load_db_schema(self) -> Schema:
         """Load schema from db"""
         fltr = {'type': 'schema'}
-        res = self.migration_collection.find_one(fltr)
+        res = self.migration_collection.find_one(fltr, projection={'value': 1, '_id': 0})
         schema = Schema()
         schema.load(res.get('value', {}) if res else {})
         return schema
@@ -335,9 +374,36 @@ class MongoengineMigrate:
         :param schema:
         :return:
         """
+        self.migration_collection.replace_one(*self._schema_record(schema), upsert=True)
+
+    def write_db_state(self, schema: Schema, graph: MigrationsGraph) -> None:
+        """
+        Write schema and migrations graph to db in one request. Schema
+        is written first
+        :param schema:
+        :param graph: migrations graph
+        :return:
+        """
+        self.migration_collection.bulk_write([
+            ReplaceOne(*self._schema_record(schema), upsert=True),
+            ReplaceOne(*self._migrations_graph_record(graph), upsert=True)
+        ])
+
+    @staticmethod
+    def _migrations_graph_record(graph: MigrationsGraph) -> Tuple[dict, dict]:
+        """Return filter and document of migrations graph record"""
+        fltr = {'type': 'migrations'}
+        applied = [m for m in graph.walk_down(graph.initial, False) if m.applied]
+        records = [{'name': m.name, 'ordering_number': num} for num, m in enumerate(applied)]
+        data = {'type': 'migrations', 'value': records}
+        return fltr, data
+
+    @staticmethod
+    def _schema_record(schema: Schema) -> Tuple[dict, dict]:
+        """Return filter and document of schema record"""
         fltr = {'type': 'schema'}
         data = {'type': 'schema', 'value': schema.dump()}
-        self.migration_collection.replace_one(fltr, data, upsert=True)
+        return fltr, data
 
     def load_migrations(self,
                         directory: Path,
@@ -355,14 +421,14 @@ class MongoengineMigrate:
         if not directory.exists():
             raise MongoengineMigrateError(f"Directory '{directory}' does not exist")
 
-        for module_file in directory.glob("*.py"):
-            if module_file.name.startswith("__"):
-                continue
+        with os.scandir(directory) as it:
+            module_files = [(entry.name[:-3], entry.path) for entry in it
+                            if entry.name.endswith('.py') and not entry.name.startswith('__')]
 
+        for migration_name, module_file in module_files:
             log.debug('> Loading migration file %s', module_file)
-            migration_name = module_file.stem
             spec = importlib.util.spec_from_file_location(
-                f"{namespace}.{migration_name}", str(module_file)
+                f"{namespace}.{migration_name}", module_file
             )
             migration_module = importlib.util.module_from_spec(spec)
             spec.loader.exec_module(migration_module)
@@ -417,14 +483,15 @@ class MongoengineMigrate:
         for migration in graph.walk_down(graph.initial, unapplied_only=True):
             log.info('Upgrading %s...', migration.name)
             for idx, action_object in enumerate(migration.get_actions(), start=1):
-                log.debug('> [%d] %s', idx, str(action_object))
+                log.debug('> [%d] %s', idx, action_object)
                 if not action_object.dummy_action and not runtime_flags.schema_only:
                     action_object.prepare(db, left_schema, migration.policy)
                     action_object.run_forward()
                     action_object.cleanup()
 
                 try:
-                    left_schema = patch(action_object.to_schema_patch(left_schema), left_schema)
+                    left_schema = _patch_schema(action_object.to_schema_patch(left_schema),
+                                                left_schema)
                 except (TypeError, ValueError, KeyError) as e:
                     raise ActionError(
                         f"Unable to apply schema patch of {action_object!r}. More likely that the "
@@ -435,8 +502,7 @@ class MongoengineMigrate:
 
             if not runtime_flags.dry_run:
                 log.debug('Writing db schema and migrations graph...')
-                self.write_db_schema(left_schema)
-                self.write_db_migrations_graph(graph)
+                self.write_db_state(left_schema, graph)
 
             if migration.name == migration_name:
                 break   # We've reached the target migration
@@ -461,17 +527,23 @@ class MongoengineMigrate:
             raise MigrationGraphError(f'Migration {migration_name} not found')
 
         log.debug('Precalculating schema diffs...')
-        # Collect schema diffs across all migrations
-        migration_diffs = {}  # {migration_name: [action1_diff, ...]}
+        # Collect backward schema diffs of migrations up to the last applied one
+        migration_diffs = {}  # {migration_name: [action1_backward_diff, ...]}
         temp_left_schema = Schema()
+        applied_left = sum(1 for m in graph.migrations.values() if m.applied)
         for migration in graph.walk_down(graph.initial, unapplied_only=False):
+            if not applied_left:
+                break  # Migrations after the last applied one will not be reverted
+
+            if migration.applied:
+                applied_left -= 1
             migration_diffs[migration.name] = []
             for action in migration.get_actions():
                 forward_patch = action.to_schema_patch(temp_left_schema)
-                migration_diffs[migration.name].append(forward_patch)
+                migration_diffs[migration.name].append(list(swap(forward_patch)))
 
                 try:
-                    temp_left_schema = patch(forward_patch, temp_left_schema)
+                    temp_left_schema = _patch_schema(forward_patch, temp_left_schema)
                 except (TypeError, ValueError, KeyError) as e:
                     raise ActionError(
                         f"Unable to apply schema patch of {action!r}. More likely that the "
@@ -485,16 +557,14 @@ class MongoengineMigrate:
 
             log.info('Downgrading %s...', migration.name)
 
-            action_diffs = zip(
-                migration.get_actions(),
-                migration_diffs[migration.name],
-                range(1, len(migration.get_actions()) + 1)
-            )
-            for action_object, action_diff, idx in reversed(list(action_diffs)):
-                log.debug('> [%d] %s', idx, str(action_object))
+            actions = migration.get_actions()
+            action_diffs = migration_diffs[migration.name]
+            for idx in reversed(range(len(actions))):
+                action_object, action_diff = actions[idx], action_diffs[idx]
+                log.debug('> [%d] %s', idx + 1, action_object)
 
                 try:
-                    left_schema = patch(list(swap(action_diff)), left_schema)
+                    left_schema = _patch_schema(action_diff, left_schema)
                 except (TypeError, ValueError, KeyError) as e:
                     raise ActionError(
                         f"Unable to apply schema patch of {action_object!r}. More likely that the "
@@ -510,8 +580,7 @@ class MongoengineMigrate:
 
             if not runtime_flags.dry_run:
                 log.debug('Writing db schema and migrations graph...')
-                self.write_db_schema(left_schema)
-                self.write_db_migrations_graph(graph)
+                self.write_db_state(left_schema, graph)
 
         self._verify_schema(left_schema)
 
@@ -549,14 +618,14 @@ class MongoengineMigrate:
         log.debug('Loading schema from database...')
         db_schema = self.load_db_schema()
 
-        # Obtain schema changes which migrations would make (including
-        #  unapplied ones)
+        # Obtain schema changes which unapplied migrations would make,
+        #  db schema already contains changes of applied ones
         # If mongoengine models schema was changed regarding db schema
         #  then try to guess which actions would reflect such changes
-        for migration in graph.walk_down(graph.initial, unapplied_only=False):
+        for migration in graph.walk_down(graph.initial, unapplied_only=True):
             for action_object in migration.get_actions():
                 try:
-                    db_schema = patch(action_object.to_schema_patch(db_schema), db_schema)
+                    db_schema = _patch_schema(action_object.to_schema_patch(db_schema), db_schema)
                 except (TypeError, ValueError, KeyError) as e:
                     raise ActionError(
                         f"Unable to apply schema patch of {action_object!r}. More likely that the "
@@ -573,33 +642,39 @@ class MongoengineMigrate:
         actions_chain = build_actions_chain(db_schema, models_schema)
 
         import_expressions = {'from mongoengine_migrate.actions import *'}
+        need_re = need_pymongo = False
         for action in actions_chain:
             # If `regex` is set in action, then we probably need 're'
-            if isinstance(action.parameters.get('regex'), re.Pattern):
+            if not need_re and isinstance(action.parameters.get('regex'), re.Pattern):
+                need_re = True
                 import_expressions.add('import re')
 
             # *Index actions use index type pymongo.* constants
             # in fields spec
-            if isinstance(action, BaseIndexAction):
+            if not need_pymongo and isinstance(action, BaseIndexAction):
+                need_pymongo = True
                 import_expressions.add('import pymongo')
 
+            if need_re and need_pymongo:
+                break
+
         log.debug('Writing migrations file...')
-        env = Environment()
-        env.filters['symbol_wrap'] = symbol_wrap
         tpl_ctx = {
             'graph': graph,
             'actions_chain': actions_chain,
             'policy_enum': MigrationPolicy,
             'import_expressions': import_expressions
         }
-        tpl_path = Path(__file__).parent / 'migration_template.tpl'
-        tpl = env.from_string(tpl_path.read_text())
-        migration_source = tpl.render(tpl_ctx)
+        migration_source = _get_migration_template().render(tpl_ctx)
 
         seq_number = str(len(graph.migrations)).zfill(4)
         name = f'{seq_number}_auto_{datetime.now().strftime("%Y%m%d_%H%M")}.py'
         migration_file = Path(self.migration_dir) / name
-        migration_file.write_text(migration_source)
+        # Write to a temporary file first, so an interrupted write will
+        # not leave a broken migration which will be loaded next time
+        tmp_file = migration_file.with_name(f'{name}.tmp')
+        tmp_file.write_bytes(migration_source.encode('utf-8'))
+        os.replace(tmp_file, migration_file)
 
         log.info('Migration file "%s" was created', migration_file)
 
@@ -614,10 +689,10 @@ class MongoengineMigrate:
                 continue
 
             col = doc_schema.parameters['collection']
-            top_lvl_doc = document_type.split(runtime_flags.DOCUMENT_NAME_SEPARATOR)[0]
-            if top_lvl_doc in collections and collections[top_lvl_doc] != col:
+            top_lvl_doc = document_type.partition(runtime_flags.DOCUMENT_NAME_SEPARATOR)[0]
+            top_lvl_col = collections.setdefault(top_lvl_doc, col)
+            if top_lvl_col != col:
                 log.warning(f'The collection in derived document {document_type} ({col}) '
                             f'is differ than its base document {top_lvl_doc} '
-                            f'({collections[top_lvl_doc]}). Please fix collection name and rerun '
+                            f'({top_lvl_col}). Please fix collection name and rerun '
                             f'an affected migration')
-            collections.setdefault(top_lvl_doc, col)
@@ -5,6 +5,8 @@ __all__ = [
 
 import functools
 import logging
+import re
+from typing import Tuple
 
 from pymongo.collection import Collection
 
@@ -25,7 +27,8 @@ def check_empty_result(collection: Collection, db_field: str, find_filter: dict)
     :param find_filter: collection.find() method filter argument
     :raises MigrationError: if any records found
     """
-    bad_records = list(collection.find(find_filter, limit=3))
+    # Only fields which are shown in error message are fetched
+    bad_records = list(collection.find(find_filter, {'_id': 1, db_field: 1}, limit=3))
     if bad_records:
         examples = (
             f'{{_id: {x.get("_id", "unknown")},...{db_field}: {x.get(db_field, "unknown")}}}'
@@ -36,6 +39,22 @@ def check_empty_result(collection: Collection, db_field: str, find_filter: dict)
                                  f"{','.join(examples)}")
 
 
+@functools.lru_cache(maxsize=None)
+def _parse_version(version: str) -> Tuple[int, ...]:
+    """
+    Parse version string to tuple of ints which can be compared.
+    Non-numeric suffix of each version component and trailing zero
+    components are dropped, e.g. '4.4.0-rc1' -> (4, 4)
+    :param version: version string
+    :return: version tuple
+    """
+    res = [int(re.match(r'\d*', part).group() or 0) for part in version.split('.')]
+    while res and res[-1] == 0:
+        res.pop()
+
+    return tuple(res)
+
+
 def mongo_version(min_version: str = None, max_version: str = None):
     """
     Decorator restrict decorated change method execution by
@@ -49,12 +68,15 @@ def mongo_version(min_version: str = None, max_version: str = None):
     :return:
     """
     assert min_version or max_version
+    min_version_tuple = _parse_version(min_version) if min_version else None
+    max_version_tuple = _parse_version(max_version) if max_version else None
 
     def dec(f):
         @functools.wraps(f)
         def w(*args, **kwargs):
-            invalid = min_version and flags.mongo_version < min_version \
-                or max_version and flags.mongo_version >= max_version
+            current_version = _parse_version(flags.mongo_version)
+            invalid = min_version_tuple and current_version < min_version_tuple \
+                or max_version_tuple and current_version >= max_version_tuple
 
             if invalid:
                 log.debug('MongoDB version is not in range (>=%s, <%s) for method %s. '
@@ -6,11 +6,12 @@ __all__ = [
 ]
 
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from copy import copy
-from typing import NamedTuple, Optional, List, Union, Callable, Any, Generator, Tuple
+from typing import NamedTuple, Optional, List, Union, Callable, Any, Generator, Tuple, Iterator
 
-import jsonpath_rw
-from pymongo import ReplaceOne
+from pymongo import ReplaceOne, UpdateOne
 from pymongo.collection import Collection
 from pymongo.database import Database
 from copy import deepcopy
@@ -23,6 +24,33 @@ from mongoengine_migrate.exceptions import InconsistencyError
 log = logging.getLogger('mongoengine-migrate')
 
 
+def _find_by_update_path(value: Any, update_path: List[str], _pos: int = 0) -> Iterator[Any]:
+    """
+    Walk through a document by given mongo update path and yield
+    every value it points to. `$[]` item means every element of an
+    array. Dict, int and str values are treated as one-element array
+    in this case, values of other types are skipped. Missing keys and
+    non-dict values on the path are also skipped
+    :param value: document or its part to walk through
+    :param update_path: update path (with `$[]`). Empty path points
+     to a document itself
+    :return: values found by path
+    """
+    if _pos == len(update_path):
+        yield value
+        return
+
+    key = update_path[_pos]
+    if key == '$[]':
+        if isinstance(value, (dict, int, str)):
+            yield from _find_by_update_path(value, update_path, _pos + 1)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                yield from _find_by_update_path(item, update_path, _pos + 1)
+    elif isinstance(value, dict) and key in value:
+        yield from _find_by_update_path(value[key], update_path, _pos + 1)
+
+
 def build_array_filters(
         self, value: Optional[Union[Callable, Any]] = None
 ) -> Optional[List[dict]]:
@@ -309,14 +337,6 @@ class DocumentUpdater:
             field_filter_path += [self.field_name]
         filter_dotpath = '.'.join(field_filter_path)
 
-        if not update_path:
-            json_path = '$'  # update_path points to any document
-        else:
-            # update_path is mongo update path
-            json_path = '.'.join(f.replace('$[]', '[*]') for f in update_path)
-            json_path = json_path.replace('.[*]', '[*]')
-        parser = jsonpath_rw.parse(json_path)
-
         find_fltr = {}
         if not self._include_missed_fields and filter_dotpath:
             find_fltr = {filter_dotpath: {'$exists': True}}
@@ -330,49 +350,73 @@ class DocumentUpdater:
 
         bulk_db = flags.database2
         bulk_collection = bulk_db[collection.name]
-
-        buf = []
-        for doc in collection.find(find_fltr):
-            prev_doc = deepcopy(doc)
-
-            # Recursively apply the callback to every embedded doc
-            for embedded_doc in parser.find(doc):
-                embedded_doc = embedded_doc.value
-                if self.document_cls:
-                    if embedded_doc is None:
-                        continue
-                    if not isinstance(embedded_doc, dict):
-                        # Field contains smth another than embedded doc
-                        if self.migration_policy.name == 'strict':
-                            raise InconsistencyError(
-                                f"Field {filter_dotpath} has wrong value {embedded_doc!r} "
-                                f"(should be embedded document) in record {doc}"
-                            )
-                        else:
+        buffer_length = flags.BULK_BUFFER_LENGTH
+
+        # If update_path points to embedded documents then callback
+        # can change only the top field they are contained in. So
+        # fetch and write back this field only
+        top_field = update_path[0] if update_path else None
+        projection = {top_field: True} if top_field else None
+
+        # Fetch documents by batches of the same size as write buffer.
+        # Cursor is closed explicitly if iteration breaks off
+        cursor = collection.find(find_fltr, projection, batch_size=buffer_length)
+
+        # Write a filled buffer in a background thread while the next
+        # one is being filled. Only one write is in flight at a time
+        with ThreadPoolExecutor(max_workers=1) as executor, closing(cursor):
+            write_future = None
+            buf = []
+            for doc in cursor:
+                prev_doc = None  # Copied lazily before the first callback call
+
+                # Recursively apply the callback to every embedded doc
+                for embedded_doc in _find_by_update_path(doc, update_path):
+                    if self.document_cls:
+                        if embedded_doc is None:
+                            continue
+                        if not isinstance(embedded_doc, dict):
+                            # Field contains smth another than embedded doc
+                            if self.migration_policy.name == 'strict':
+                                raise InconsistencyError(
+                                    f"Field {filter_dotpath} has wrong value {embedded_doc!r} "
+                                    f"(should be embedded document) in record {doc}"
+                                )
+                            else:
+                                continue
+                        if embedded_doc.get('_cls', self.document_cls) != self.document_cls:
+                            # Skip since document doesn't belong to
+                            # document class (document inheritance,
+                            # DynamicField)
+                            # See `DocumentMetaclass` implementation
                             continue
-                    if embedded_doc.get('_cls', self.document_cls) != self.document_cls:
-                        # Skip since document doesn't belong to
-                        # document class (document inheritance,
-                        # DynamicField)
-                        # See `DocumentMetaclass` implementation
-                        continue
-                ctx = ByDocContext(collection=collection,
-                                   document=embedded_doc,
-                                   filter_dotpath=filter_dotpath)
-                # Callback should change a dict in-place
-                callback(ctx)
-
-            # Write a document only if it was changed by callback
-            if prev_doc != doc:
-                buf.append(ReplaceOne({'_id': doc['_id']}, doc, upsert=False))
-
-            # Flush buffer
-            if len(buf) >= flags.BULK_BUFFER_LENGTH:
+                    ctx = ByDocContext(collection=collection,
+                                       document=embedded_doc,
+                                       filter_dotpath=filter_dotpath)
+                    if prev_doc is None:
+                        prev_doc = deepcopy(doc)
+                    # Callback should change a dict in-place
+                    callback(ctx)
+
+                # Write a document only if it was changed by callback
+                if prev_doc is not None and prev_doc != doc:
+                    if top_field:
+                        op = UpdateOne({'_id': doc['_id']}, {'$set': {top_field: doc[top_field]}})
+                    else:
+                        op = ReplaceOne({'_id': doc['_id']}, doc, upsert=False)
+                    buf.append(op)
+
+                # Flush buffer
+                if len(buf) >= buffer_length:
+                    if write_future is not None:
+                        write_future.result()
+                    write_future = executor.submit(bulk_collection.bulk_write, buf, ordered=False)
+                    buf = []  # Buffer in flight must not be modified
+
+            if write_future is not None:
+                write_future.result()
+            if buf:
                 bulk_collection.bulk_write(buf, ordered=False)
-                buf.clear()
-        if buf:
-            bulk_collection.bulk_write(buf, ordered=False)
-            buf.clear()
 
     def _get_embedded_paths(self) -> Generator[Tuple[Collection, list, list], None, None]:
         """
@@ -0,0 +1,126 @@
+import random
+
+import pytest
+
+from mongoengine_migrate.exceptions import MigrationGraphError
+from mongoengine_migrate.graph import Migration, MigrationsGraph
+
+
+@pytest.fixture
+def migration_tree():
+    """
+      _____(01)_____
+     V      V       V
+    (02)   (03)    (04)__
+     |      |      V     V
+      \\     /    (05)  (06)
+       \\   /_____/  \\  /
+        V VV         VV
+        (07)        (08)
+           \\___  ___/
+               VV
+              (09)
+               V
+              (10)
+    """
+    return [
+        Migration(name='01', dependencies=[]),
+        Migration(name='02', dependencies=['01']),
+        Migration(name='03', dependencies=['01']),
+        Migration(name='04', dependencies=['01']),
+        Migration(name='05', dependencies=['04']),
+        Migration(name='06', dependencies=['04']),
+        Migration(name='07', dependencies=['02', '03', '05']),
+        Migration(name='08', dependencies=['05', '06']),
+        Migration(name='09', dependencies=['07', '08']),
+        Migration(name='10', dependencies=['09']),
+    ]
+
+
+class TestMigrationsGraph:
+    @pytest.fixture(autouse=True, params=(0, 1, 2))
+    def setup(self, request, migration_tree):
+        # Migrations insertion order should not matter
+        random.Random(request.param).shuffle(migration_tree)
+        self.obj = MigrationsGraph()
+        for m in migration_tree:
+            self.obj.add(m)
+
+    def test_walk_down__should_return_every_migration_after_its_dependencies(self):
+        res = [m.name for m in self.obj.walk_down(self.obj.initial, unapplied_only=False)]
+
+        assert sorted(res) == sorted(self.obj.migrations.keys())
+        for name in res:
+            deps = self.obj.migrations[name].dependencies
+            assert all(res.index(dep) < res.index(name) for dep in deps)
+
+    def test_walk_down__if_some_migrations_were_applied__should_skip_them(self):
+        for name in ('01', '02', '04'):
+            self.obj.migrations[name].applied = True
+
+        res = [m.name for m in self.obj.walk_down(self.obj.initial)]
+
+        assert sorted(res) == ['03', '05', '06', '07', '08', '09', '10']
+
+    def test_walk_up__should_return_every_migration_before_its_dependencies(self):
+        res = [m.name for m in self.obj.walk_up(self.obj.last, applied_only=False)]
+
+        assert sorted(res) == sorted(self.obj.migrations.keys())
+        for name in res:
+            deps = self.obj.migrations[name].dependencies
+            assert all(res.index(dep) > res.index(name) for dep in deps)
+
+    def test_walk_down_walk_up__if_migration_was_added_after_walk__should_return_it(self):
+        list(self.obj.walk_down(self.obj.initial, unapplied_only=False))
+        list(self.obj.walk_up(self.obj.last, applied_only=False))
+
+        self.obj.add(Migration(name='11', dependencies=['10']))
+
+        res = [m.name for m in self.obj.walk_down(self.obj.initial, unapplied_only=False)]
+        assert res[-1] == '11'
+        res = [m.name for m in self.obj.walk_up(self.obj.last, applied_only=False)]
+        assert res[0] == '11'
+
+    def test_walk_down_walk_up__on_empty_graph__should_return_nothing(self):
+        obj = MigrationsGraph()
+
+        assert list(obj.walk_down(obj.initial)) == []
+        assert list(obj.walk_up(obj.last)) == []
+
+    def test_walk_down__if_graph_has_closed_cycle__should_raise_error(self):
+        obj = MigrationsGraph()
+        obj.add(Migration(name='01', dependencies=[]))
+        obj.add(Migration(name='02', dependencies=['03']))
+        obj.add(Migration(name='03', dependencies=['02']))
+
+        with pytest.raises(MigrationGraphError):
+            list(obj.walk_down(obj.migrations['02'], unapplied_only=False))
+
+    def test_verify__if_graph_is_correct__should_not_raise(self):
+        self.obj.verify()
+
+    def test_verify__if_graph_has_closed_cycle__should_raise_error(self):
+        obj = MigrationsGraph()
+        obj.add(Migration(name='01', dependencies=[]))
+        obj.add(Migration(name='02', dependencies=['01', '03']))
+        obj.add(Migration(name='03', dependencies=['02']))
+        obj.add(Migration(name='04', dependencies=['03']))
+
+        with pytest.raises(MigrationGraphError, match='closed cycle'):
+            obj.verify()
+
+
+class TestMigration:
+    def test_eq__if_all_slots_are_equal__should_return_true(self):
+        obj1 = Migration(name='01', dependencies=['02', '03'], module=None)
+        obj2 = Migration(name='01', dependencies=('03', '02'), module=None)
+
+        assert obj1 == obj2
+        assert not obj1 != obj2
+
+    def test_eq__if_some_slot_differs_or_unset__should_return_false(self):
+        obj = Migration(name='01', dependencies=[], module=None)
+
+        assert obj != Migration(name='01', dependencies=[], module=None, applied=True)
+        assert obj != Migration(name='01', dependencies=[])
+        assert obj != object()
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+from mongoengine import Document, fields
+from mongoengine.base import _document_registry
+
+from mongoengine_migrate.loader import symbol_wrap, MongoengineMigrate
+
+
+@pytest.mark.parametrize('value,width,expect', (
+        ('', 10, ''),
+        ('a, b', 10, 'a, b'),
+        ('aaa, bbb, ccc, ddd', 10, 'aaa, bbb,\nccc, ddd'),
+        ('aaa, bbb, ccc, ddd', 5, 'aaa,\nbbb,\nccc,\nddd'),
+        ('aaaaaaaaaaaa, b', 10, 'aaaaaaaaaaaa, b'),  # No separator in width
+))
+def test_symbol_wrap__should_split_only_by_given_symbol(value, width, expect):
+    assert symbol_wrap(value, width) == expect
+
+
+def test_symbol_wrap__should_take_into_account_wrapstring_length():
+    res = symbol_wrap('aaa, bbb, ccc, ddd', 13, wrapstring='\n    ')
+
+    assert res == 'aaa, bbb,\n    ccc, ddd'
+
+
+class TestMongoengineMigrateMakemigrations:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        # Collect schema only of documents defined in a test
+        registry = _document_registry.copy()
+        _document_registry.clear()
+
+        self.migrations_dir = tmp_path
+        self.obj = MongoengineMigrate(mongo_uri=os.environ['DATABASE_URL'],
+                                      collection_name='mongoengine_migrate',
+                                      migrations_dir=str(tmp_path))
+
+        yield
+
+        _document_registry.clear()
+        _document_registry.update(registry)
+
+    @staticmethod
+    def define_document(**doc_fields):
+        return type('MakemigrationsDoc', (Document,), doc_fields)
+
+    def get_migration_files(self):
+        return sorted(p.name for p in self.migrations_dir.glob('*.py'))
+
+    def test_makemigrations__if_drop_field_migration_was_applied__should_not_make_migration(
+            self
+    ):
+        self.define_document(field1=fields.StringField(), field2=fields.StringField())
+        self.obj.makemigrations()
+        self.obj.migrate()
+
+        self.define_document(field2=fields.StringField())
+        self.obj.makemigrations()
+        self.obj.migrate()
+        expect = self.get_migration_files()
+        assert len(expect) == 2
+        assert "DropField('MakemigrationsDoc', 'field1'" in \
+            (self.migrations_dir / expect[1]).read_text()
+
+        self.obj.makemigrations()
+
+        assert self.get_migration_files() == expect
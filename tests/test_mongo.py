@@ -0,0 +1,18 @@
+import pytest
+
+from mongoengine_migrate.mongo import _parse_version
+
+
+@pytest.mark.parametrize('lesser,greater', (
+        ('3.6', '4.0'),
+        ('3.6', '10.0'),
+        ('4.2.1', '4.10'),
+        ('3.5.99', '3.6'),
+        ('4.4.0-rc1', '4.4.1'),
+))
+def test_parse_version__should_compare_versions_numerically(lesser, greater):
+    assert _parse_version(lesser) < _parse_version(greater)
+
+
+def test_parse_version__if_trailing_zeros__should_be_equal():
+    assert _parse_version('3.6') == _parse_version('3.6.0')
@@ -0,0 +1,65 @@
+import pytest
+from mongoengine import fields
+
+from mongoengine_migrate.fields import converters, registry
+from mongoengine_migrate.fields.registry import (
+    CONVERTION_MATRIX,
+    CONVERTION_MATRIX_BY_NAME,
+    resolve_converter
+)
+
+
+def test_convertion_matrix__identical_rows__should_be_shared():
+    assert CONVERTION_MATRIX[fields.IntField] is CONVERTION_MATRIX[fields.LongField]
+    assert CONVERTION_MATRIX[fields.ObjectIdField] is CONVERTION_MATRIX[fields.FileField]
+
+
+def test_convertion_matrix__rows__should_be_read_only():
+    with pytest.raises(TypeError):
+        CONVERTION_MATRIX[fields.IntField][fields.StringField] = converters.nothing
+
+
+@pytest.mark.parametrize('from_field_cls,to_field_cls', (
+        (fields.IntField, fields.IntField),
+        (fields.StringField, fields.StringField),
+        (fields.URLField, fields.StringField),  # Child -> parent
+        (fields.DateTimeField, fields.DateField),  # Parent -> child
+))
+def test_resolve_converter__if_the_same_class_or_parent_class__should_return_nothing(
+        from_field_cls, to_field_cls
+):
+    assert resolve_converter(from_field_cls, to_field_cls) is converters.nothing
+
+
+def test_resolve_converter__should_return_converter_from_matrix_row():
+    assert resolve_converter(fields.IntField, fields.StringField) is converters.to_string
+    assert resolve_converter(fields.IntField, fields.DynamicField) is converters.nothing
+    assert resolve_converter(fields.IntField, fields.SequenceField) is converters.drop_field
+
+
+def test_convertion_matrix_by_name__should_match_resolved_converters():
+    assert CONVERTION_MATRIX_BY_NAME[('IntField', 'StringField')] is converters.to_string
+    assert CONVERTION_MATRIX_BY_NAME[('URLField', 'StringField')] is converters.nothing
+    assert CONVERTION_MATRIX_BY_NAME[('StringField', 'URLField')] == resolve_converter(
+        fields.StringField, fields.URLField
+    )
+
+
+def test_clear_convertion_cache__should_take_into_account_added_type_keys(monkeypatch):
+    class CustomStringField(fields.StringField):
+        pass
+
+    monkeypatch.setattr(registry, 'type_key_registry', registry.type_key_registry.copy())
+    monkeypatch.setattr(registry, '_derived_type_keys',
+                        {k: v.copy() for k, v in registry._derived_type_keys.items()})
+    monkeypatch.setattr(registry, '_unhandled_type_keys', registry._unhandled_type_keys.copy())
+    assert ('IntField', 'StringField') in registry.CONVERTION_MATRIX_BY_NAME
+
+    registry.add_type_key(CustomStringField)
+
+    try:
+        assert registry.CONVERTION_MATRIX_BY_NAME[('IntField', 'CustomStringField')] \
+            is converters.to_string
+    finally:
+        monkeypatch.undo()
+        registry.clear_convertion_cache()
@@ -0,0 +1,33 @@
+import pytest
+
+from mongoengine_migrate.updater import _find_by_update_path
+
+
+@pytest.mark.parametrize('update_path,expect', (
+        ([], [{'a': [{'b': 1}, {'b': 2}, {'c': 3}], 'd': {'b': 4}}]),
+        (['a', '$[]', 'b'], [1, 2]),
+        (['d', 'b'], [4]),
+        (['d', '$[]', 'b'], [4]),
+        (['a', 'b'], []),
+        (['x', '$[]'], []),
+))
+def test_find_by_update_path__should_return_values_by_path(update_path, expect):
+    doc = {'a': [{'b': 1}, {'b': 2}, {'c': 3}], 'd': {'b': 4}}
+
+    res = list(_find_by_update_path(doc, update_path))
+
+    assert res == expect
+
+
+def test_find_by_update_path__should_return_the_same_objects():
+    doc = {'a': [{'b': {}}, {'b': {}}]}
+
+    res = list(_find_by_update_path(doc, ['a', '$[]', 'b']))
+
+    assert res[0] is doc['a'][0]['b'] and res[1] is doc['a'][1]['b']
+
+
+def test_find_by_update_path__if_array_value_is_none__should_skip_it():
+    doc = {'a': None}
+
+    assert list(_find_by_update_path(doc, ['a', '$[]'])) == []